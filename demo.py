@@ -15,32 +15,35 @@ def main():
     # Initialize assistant
     assistant = LLMSQLAssistant()
     
-    # Demo with Client 2 (has good data)
-    print("📋 Demo Client: Client 2 (77 transactions, $13,806.73 total)")
-    assistant.set_client(2)
-    
-    # Demo queries
-    demo_queries = [
-        "How much did I spend in September?",
-        "What did I spend on restaurants?", 
-        "Show me my biggest expenses",
-        "How many transactions do I have?"
-    ]
-    
-    print(f"\n🧪 Running {len(demo_queries)} demo queries...")
-    print("-" * 50)
-    
-    for i, query in enumerate(demo_queries, 1):
-        print(f"\n{i}. 💬 Query: '{query}'")
-        print("   🔄 Processing...")
+    try:
+        # Demo with Client 2 (has good data)
+        print("📋 Demo Client: Client 2 (77 transactions, $13,806.73 total)")
+        assistant.set_client(2)
+        
+        # Demo queries
+        demo_queries = [
+            "How much did I spend in September?",
+            "What did I spend on restaurants?", 
+            "Show me my biggest expenses",
+            "How many transactions do I have?"
+        ]
+        
+        print(f"\n🧪 Running {len(demo_queries)} demo queries as one batch...")
+        print("-" * 50)
         
-        result = assistant.process_query(query)
+        # One LLM call generates SQL for every query not answered by the router
+        results = assistant.process_queries_batch(demo_queries)
         
-        print(f"   📊 SQL: {result.sql_generated}")
-        if result.success:
-            print(f"   💡 Response: {result.natural_response}")
-        else:
-            print(f"   ❌ Error: {result.error}")
+        for i, (query, result) in enumerate(zip(demo_queries, results), 1):
+            print(f"\n{i}. 💬 Query: '{query}'")
+            
+            print(f"   📊 SQL: {result.sql_generated}")
+            if result.success:
+                print(f"   💡 Response: {result.natural_response}")
+            else:
+                print(f"   ❌ Error: {result.error}")
+    finally:
+        assistant.close()
     
     print("\n" + "=" * 50)
     print("✅ Demo complete! For interactive mode, run: python3 run.py")
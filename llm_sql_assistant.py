@@ -5,15 +5,44 @@ Direct SQL generation from natural language for 95%+ accuracy.
 """
 
 import openai
+import httpx
 import json
+import asyncio
+import importlib.util
 import os
-from typing import Dict, Any, Optional
-from dataclasses import dataclass
-from sql_query_tool import SQLQueryTool
+import re
+import hashlib
+from itertools import islice
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+from dataclasses import dataclass, replace
+from sql_query_tool import SQLQueryTool, LazyRows, loads_json, dumps_json_indented
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Month name/abbreviation -> month number, for the deterministic intent router
+MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3,
+    "apr": 4, "april": 4, "jun": 6, "june": 6, "jul": 7, "july": 7,
+    "aug": 8, "august": 8, "sep": 9, "sept": 9, "september": 9,
+    "oct": 10, "october": 10, "nov": 11, "november": 11, "dec": 12, "december": 12,
+}
+# Bare "may" is left out: it is far more often the verb than the month
+# Words a routed question may contain besides category and month names; any
+# other word (more, than, average, top, per, day, streaming, ...) goes to the LLM
+ROUTER_WORDS = {
+    "how", "much", "many", "what", "what's", "did", "do", "i", "i've", "have", "has", "made", "make",
+    "is", "was", "were", "spend", "spent", "spending", "transaction", "transactions", "money",
+    "total", "overall", "in", "on", "at", "for", "during", "of", "my", "the", "all", "2023",
+}
+DEFAULT_YEAR = 2023  # Data covers June-September 2023
+RESPONSE_CACHE_SIZE = 1024  # Max cached (client, query) results
+RESPONSE_SAMPLE_ROWS = 5  # Rows sent to the LLM for natural responses
+RESPONSE_LIST_VALUES = 10  # Values listed in deterministic multi-row responses
+SPEND_TOTAL_COLUMNS = {"total", "spent", "spending", "total_spent", "total_spending", "sum(abs(amt))"}
+HTTP_TIMEOUT = 30.0  # Seconds per OpenAI request
+
 @dataclass
 class QueryResult:
     """Result of a natural language query."""
@@ -31,7 +60,6 @@ class LLMSQLAssistant:
         """Initialize the LLM+SQL assistant."""
         if db_path is None:
             # Auto-detect database path - try multiple locations for submission
-            import os
             current_dir = os.path.dirname(os.path.abspath(__file__))
             
             # Try submission structure first
@@ -52,45 +80,160 @@ class LLMSQLAssistant:
         self.sql_tool = SQLQueryTool(db_path)
         self.current_client_id = None
         
-        # Initialize OpenAI
+        # LRU cache of successful QueryResults keyed by (client, normalized query)
+        self._response_cache: "OrderedDict[str, QueryResult]" = OrderedDict()
+        
+        # Byte-identical across calls so the provider can cache the prompt prefix;
+        # the client id is bound by the SQL tool via the :CLIENT_ID parameter
+        self._sql_system_prompt = f"""SQL expert. SQLite tables: {self.sql_tool._schema_compact}.
+Rules: SELECT only, always filter clnt_id = :CLIENT_ID (keep the placeholder literally); use SUM(ABS(amt)) for spending; txn_date is 'YYYY-MM-DD HH:MM:SS', use >= and < for ranges, months without a year are 2023.
+Example: "How much did I spend in September?" → SELECT SUM(ABS(amt)) FROM transactions WHERE clnt_id = :CLIENT_ID AND txn_date >= '2023-09-01' AND txn_date < '2023-10-01'
+Give result columns short aliases and a one-sentence response_template that formats a single result row via str.format on those aliases.
+Output JSON: {{"sql": "SELECT SUM(ABS(amt)) AS total, COUNT(*) AS count ...", "explanation": "Brief explanation", "response_template": "You spent ${{total:,.2f}} across {{count}} transactions."}}"""
+        
+        # Deterministic intent router for common questions (no LLM round-trip)
+        self._month_re = re.compile(
+            r"\b(" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\b", re.IGNORECASE
+        )
+        self._spend_re = re.compile(r"\b(spen[dt]|spending)\b", re.IGNORECASE)
+        self._count_re = re.compile(r"\bhow many\b.*\btransactions?\b", re.IGNORECASE)
+        categories = self.sql_tool.execute_query("SELECT DISTINCT cat FROM transactions")
+        self._cat_set = {row["cat"] for row in categories["results"]}
+        # Singular stem -> every category sharing it, so "bank fees" finds both
+        # "Bank Fees" and "Bank Fee" and "restaurant" finds "Restaurants"
+        self._cat_groups: Dict[str, List[str]] = {}
+        for cat in sorted(self._cat_set):
+            self._cat_groups.setdefault(cat.lower().rstrip("s"), []).append(cat)
+        stems = sorted(self._cat_groups, key=len, reverse=True)
+        self._cat_re = re.compile(
+            r"\b(" + "|".join(re.escape(stem) + "s?" for stem in stems) + r")\b", re.IGNORECASE
+        ) if stems else None
+        self._word_re = re.compile(r"[a-z0-9']+")
+        
+        # Initialize OpenAI - small, fast models by default, overridable via env
+        self.sql_model = os.getenv("OPENAI_SQL_MODEL", "gpt-4o-mini")
+        self.nl_model = os.getenv("OPENAI_NL_MODEL", "gpt-4o-mini")
         self.api_key = os.getenv("OPENAI_API_KEY")
         if self.api_key:
-            self.client = openai.OpenAI(api_key=self.api_key)
+            # Shared keep-alive HTTP clients (HTTP/2 when h2 is installed) so
+            # requests reuse connections instead of repeating TLS handshakes
+            http2 = importlib.util.find_spec("h2") is not None
+            limits = httpx.Limits(max_keepalive_connections=10, keepalive_expiry=60)
+            # The SDK's httpx subclasses keep its defaults (follow_redirects, ...)
+            self._http = openai.DefaultHttpxClient(http2=http2, timeout=HTTP_TIMEOUT, limits=limits)
+            self._ahttp = openai.DefaultAsyncHttpxClient(http2=http2, timeout=HTTP_TIMEOUT, limits=limits)
+            self.client = openai.OpenAI(api_key=self.api_key, http_client=self._http)
+            self.aclient = openai.AsyncOpenAI(api_key=self.api_key, http_client=self._ahttp)
             print("✅ OpenAI integration enabled")
         else:
+            self._http = None
+            self._ahttp = None
             self.client = None
+            self.aclient = None
             print("⚠️ OpenAI API key not found - running in fallback mode")
     
+    def close(self) -> None:
+        """Close the sync HTTP client and database connections.
+        
+        Callers that used the async API should await aclose() instead.
+        """
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+        self.sql_tool.close()
+    
+    async def aclose(self) -> None:
+        """Close the async HTTP client, then everything close() closes."""
+        if self._ahttp is not None:
+            await self._ahttp.aclose()
+            self._ahttp = None
+        self.close()
+    
     def set_client(self, client_id: int) -> bool:
         """Set the current client for queries."""
-        # Verify client exists
-        result = self.sql_tool.execute_query(
-            f"SELECT COUNT(*) as count FROM transactions WHERE clnt_id = {client_id}"
-        )
+        # One lookup both verifies the client exists and fetches its summary
+        summary = self.sql_tool.client_summary(client_id)
         
-        if result["success"] and result["results"] and result["results"][0]["count"] > 0:
+        if summary and summary["transaction_count"] > 0:
             self.current_client_id = client_id
-            
-            # Get client summary
-            client_result = self.sql_tool.execute_query(
-                f"SELECT * FROM client_summary WHERE clnt_id = {client_id}"
-            )
-            
-            if client_result["success"] and client_result["results"]:
-                summary = client_result["results"][0]
-                print(f"✓ Switched to client {client_id}")
-                print(f"  • {summary['transaction_count']} transactions")
-                print(f"  • ${summary['total_spending']:.2f} total spending")
-                print(f"  • Data from {summary['first_transaction'][:10]} to {summary['last_transaction'][:10]}")
-                return True
+            print(f"✓ Switched to client {client_id}")
+            print(f"  • {summary['transaction_count']} transactions")
+            print(f"  • ${summary['total_spending']:.2f} total spending")
+            print(f"  • Data from {summary['first_transaction'][:10]} to {summary['last_transaction'][:10]}")
+            return True
         
         print(f"❌ Client {client_id} not found or has no transactions")
         return False
     
-    def generate_sql(self, user_query: str) -> Dict[str, Any]:
-        """Generate SQL query from natural language using LLM."""
+    def _try_template(self, user_query: str) -> Optional[Dict[str, Any]]:
+        """Match common questions to canonical parameterized SQL.
         
-        if not self.client:
+        Returns a generate_sql-style result, or None to fall back to the LLM.
+        """
+        if not self.current_client_id:
+            return None
+        
+        is_count = bool(self._count_re.search(user_query))
+        if not is_count and not self._spend_re.search(user_query):
+            return None
+        
+        # Only route when every word is understood; anything else (comparisons,
+        # averages, per-day breakdowns, unknown categories) goes to the LLM
+        text = user_query.lower()
+        cat_matches = self._cat_re.findall(text) if self._cat_re else []
+        month_matches = self._month_re.findall(text)
+        if len({m.rstrip("s") for m in cat_matches}) > 1 or len({MONTHS[m] for m in month_matches}) > 1:
+            return None
+        remainder = self._month_re.sub(" ", self._cat_re.sub(" ", text) if self._cat_re else text)
+        if any(word not in ROUTER_WORDS for word in self._word_re.findall(remainder)):
+            return None
+        
+        conditions = ["clnt_id = :CLIENT_ID"]
+        params = {}
+        scope = ""
+        
+        if cat_matches:
+            cats = self._cat_groups[cat_matches[0].rstrip("s")]
+            names = [f"cat{i}" for i in range(len(cats))]
+            params.update(zip(names, cats))
+            conditions.append(f"cat IN ({', '.join(':' + name for name in names)})")
+            scope += f" on {' and '.join(cats)}"
+        
+        if month_matches:
+            month = MONTHS[month_matches[0]]
+            start_year, end_year, end_month = DEFAULT_YEAR, DEFAULT_YEAR, month + 1
+            if end_month > 12:
+                end_year, end_month = DEFAULT_YEAR + 1, 1
+            params["start"] = f"{start_year}-{month:02d}-01"
+            params["end"] = f"{end_year}-{end_month:02d}-01"
+            conditions.append("txn_date >= :start AND txn_date < :end")
+            scope += f" in {month_matches[0].capitalize()}"
+        
+        where = " AND ".join(conditions)
+        if is_count:
+            return {
+                "success": True,
+                "sql": f"SELECT COUNT(*) AS count FROM transactions WHERE {where}",
+                "params": params,
+                "explanation": "Transaction count (template)",
+                "response_template": f"You have {{count:,}} transactions{scope}."
+            }
+        
+        if not params:
+            return None
+        
+        return {
+            "success": True,
+            "sql": "SELECT COALESCE(SUM(ABS(amt)), 0) AS total, COUNT(*) AS count "
+                   f"FROM transactions WHERE {where}",
+            "params": params,
+            "explanation": "Spending total (template)",
+            "response_template": f"You spent ${{total:,.2f}}{scope} across {{count:,}} transactions."
+        }
+    
+    def _check_sql_ready(self, client) -> Optional[Dict[str, Any]]:
+        """Return an error result if SQL generation cannot run, else None."""
+        if not client:
             return {
                 "success": False,
                 "sql": None,
@@ -104,80 +247,175 @@ class LLMSQLAssistant:
                 "error": "No client selected. Please select a client first."
             }
         
-        # Get database schema for context
-        schema = self.sql_tool.get_schema_info()
+        return None
+    
+    def _sql_request(self, user_query: str) -> Dict[str, Any]:
+        """Build chat completion arguments for SQL generation."""
+        # Per-query variables go last so the static prefix stays cacheable
+        user_prompt = f"QUERY={user_query}"
+        
+        return {
+            "model": self.sql_model,
+            "messages": [
+                {"role": "system", "content": self._sql_system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": 0.1,  # Low temperature for consistent SQL generation
+            "max_tokens": 300,
+            "stream": True  # Stop reading as soon as the JSON object is complete
+        }
+    
+    @staticmethod
+    def _sql_result_from(parsed: Any) -> Dict[str, Any]:
+        """Convert a parsed {sql, explanation, response_template} object to a result."""
+        if not isinstance(parsed, dict) or not parsed.get("sql"):
+            return {
+                "success": False,
+                "sql": None,
+                "error": f"Could not parse SQL from response: {parsed}"
+            }
+        
+        return {
+            "success": True,
+            "sql": parsed.get("sql"),
+            "explanation": parsed.get("explanation", ""),
+            "response_template": parsed.get("response_template")
+        }
+    
+    def _parse_sql_response(self, response_text: str) -> Dict[str, Any]:
+        """Parse the model's SQL generation output."""
+        # Parse JSON response, ignoring any text around the object (e.g. code fences)
+        start, end = response_text.find("{"), response_text.rfind("}")
+        try:
+            parsed = loads_json(response_text[start:end + 1] if 0 <= start < end else response_text)
+            return self._sql_result_from(parsed)
+        except json.JSONDecodeError:
+            # Try to extract SQL from text if JSON parsing fails
+            if "SELECT" in response_text.upper():
+                # Extract SQL statement
+                lines = response_text.split('\n')
+                sql_line = next((line for line in lines if 'SELECT' in line.upper()), None)
+                if sql_line:
+                    return {
+                        "success": True,
+                        "sql": sql_line.strip(),
+                        "explanation": "SQL extracted from response"
+                    }
+            
+            return {
+                "success": False,
+                "sql": None,
+                "error": f"Could not parse SQL from response: {response_text}"
+            }
+    
+    @staticmethod
+    def _chunk_text(chunk: Any) -> str:
+        """Text content of a streamed completion chunk."""
+        if not chunk.choices:
+            return ""
+        return chunk.choices[0].delta.content or ""
+    
+    @staticmethod
+    def _json_object_complete(buffer: str) -> bool:
+        """Whether the buffer holds a complete JSON object (braces balanced and parseable)."""
+        opens = buffer.count("{")
+        if opens == 0 or opens != buffer.count("}"):
+            return False
+        try:
+            loads_json(buffer[buffer.index("{"):buffer.rindex("}") + 1])
+            return True
+        except json.JSONDecodeError:
+            return False
+    
+    def generate_sql(self, user_query: str) -> Dict[str, Any]:
+        """Generate SQL query from natural language using LLM."""
+        error = self._check_sql_ready(self.client)
+        if error:
+            return error
+        
+        try:
+            stream = self.client.chat.completions.create(**self._sql_request(user_query))
+            buffer = ""
+            try:
+                for chunk in stream:
+                    buffer += self._chunk_text(chunk)
+                    if self._json_object_complete(buffer):
+                        break
+            finally:
+                stream.close()
+            return self._parse_sql_response(buffer.strip())
+        except Exception as e:
+            return {
+                "success": False,
+                "sql": None,
+                "error": f"OpenAI API error: {str(e)}"
+            }
+    
+    def generate_sqls_batch(self, user_queries: List[str]) -> List[Dict[str, Any]]:
+        """Generate SQL for several queries with a single LLM call.
+        
+        Returns one generate_sql-style result per query, in order.
+        """
+        error = self._check_sql_ready(self.client)
+        if error:
+            return [dict(error) for _ in user_queries]
+        
+        numbered = "\n".join(f"{i}) {q}" for i, q in enumerate(user_queries, 1))
+        user_prompt = (
+            "Return a JSON array with one {sql, explanation, response_template} object per query, in order:\n"
+            f"{numbered}"
+        )
         
-        # Create system prompt with schema and constraints
-        system_prompt = f"""You are a financial data SQL expert. Generate PRECISE SQL queries for transaction data analysis.
-
-DATABASE SCHEMA:
-{json.dumps(schema, indent=2)}
-
-CRITICAL RULES:
-1. ALWAYS filter by clnt_id = {self.current_client_id}
-2. Use ABS(amt) for spending calculations (amounts can be negative)
-3. Date format: 'YYYY-MM-DD HH:MM:SS' - use >= and < for ranges
-4. September 2023: txn_date >= '2023-09-01' AND txn_date < '2023-10-01'
-5. Only use SELECT statements
-6. Only query 'transactions' or 'client_summary' tables
-7. For spending queries, use SUM(ABS(amt))
-8. For month queries without year, assume 2023
-
-RESPONSE FORMAT:
-{{"sql": "SELECT ...", "explanation": "Brief explanation"}}"""
-
-        user_prompt = f"""Generate SQL for this query: "{user_query}"
-
-Current client: {self.current_client_id}
-Query focus: Return exact numerical results, not approximations.
-
-Examples:
-- "How much did I spend in September?" → SELECT SUM(ABS(amt)) FROM transactions WHERE clnt_id = {self.current_client_id} AND txn_date >= '2023-09-01' AND txn_date < '2023-10-01'
-- "Show me restaurants" → SELECT * FROM transactions WHERE clnt_id = {self.current_client_id} AND cat = 'Restaurants'
-- "What did I spend on shops?" → SELECT SUM(ABS(amt)) FROM transactions WHERE clnt_id = {self.current_client_id} AND cat = 'Shops'
-
-Generate the SQL query:"""
-
         try:
             response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+                model=self.sql_model,
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": self._sql_system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
-                temperature=0.1,  # Low temperature for consistent SQL generation
-                max_tokens=300
+                temperature=0.1,
+                max_tokens=300 * len(user_queries)
             )
-            
             response_text = response.choices[0].message.content.strip()
-            
-            # Parse JSON response
+        except Exception as e:
+            return [{
+                "success": False,
+                "sql": None,
+                "error": f"OpenAI API error: {str(e)}"
+            } for _ in user_queries]
+        
+        start, end = response_text.find("["), response_text.rfind("]")
+        try:
+            parsed = loads_json(response_text[start:end + 1] if 0 <= start < end else response_text)
+        except json.JSONDecodeError:
+            parsed = None
+        
+        if not isinstance(parsed, list) or len(parsed) != len(user_queries):
+            return [{
+                "success": False,
+                "sql": None,
+                "error": f"Could not parse {len(user_queries)} SQL queries from response: {response_text}"
+            } for _ in user_queries]
+        
+        return [self._sql_result_from(item) for item in parsed]
+    
+    async def generate_sql_async(self, user_query: str) -> Dict[str, Any]:
+        """Async version of generate_sql."""
+        error = self._check_sql_ready(self.aclient)
+        if error:
+            return error
+        
+        try:
+            stream = await self.aclient.chat.completions.create(**self._sql_request(user_query))
+            buffer = ""
             try:
-                parsed = json.loads(response_text)
-                return {
-                    "success": True,
-                    "sql": parsed.get("sql"),
-                    "explanation": parsed.get("explanation", "")
-                }
-            except json.JSONDecodeError:
-                # Try to extract SQL from text if JSON parsing fails
-                if "SELECT" in response_text.upper():
-                    # Extract SQL statement
-                    lines = response_text.split('\n')
-                    sql_line = next((line for line in lines if 'SELECT' in line.upper()), None)
-                    if sql_line:
-                        return {
-                            "success": True,
-                            "sql": sql_line.strip(),
-                            "explanation": "SQL extracted from response"
-                        }
-                
-                return {
-                    "success": False,
-                    "sql": None,
-                    "error": f"Could not parse SQL from response: {response_text}"
-                }
-                
+                async for chunk in stream:
+                    buffer += self._chunk_text(chunk)
+                    if self._json_object_complete(buffer):
+                        break
+            finally:
+                await stream.close()
+            return self._parse_sql_response(buffer.strip())
         except Exception as e:
             return {
                 "success": False,
@@ -185,25 +423,32 @@ Generate the SQL query:"""
                 "error": f"OpenAI API error: {str(e)}"
             }
     
-    def generate_natural_response(self, user_query: str, sql_results: Dict[str, Any]) -> str:
-        """Generate natural language response from SQL results."""
-        
-        if not self.client:
-            return self._fallback_response(sql_results)
+    @staticmethod
+    def _summarize_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Row count, a few sample rows and numeric column totals - O(1) prompt size.
         
-        if not sql_results["success"]:
-            return f"I couldn't process your query due to an error: {sql_results.get('error', 'Unknown error')}"
-        
-        results = sql_results["results"]
-        if not results:
-            return "I couldn't find any transactions matching your criteria. You might want to try a different time period or category."
+        Only the sample rows are materialized as dicts; totals read raw columns.
+        """
+        totals = {}
+        for key, value in results[0].items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and not key.endswith("_id"):
+                values = results.column(key) if isinstance(results, LazyRows) else (row[key] for row in results)
+                totals[key] = round(sum(v for v in values if isinstance(v, (int, float))), 2)
         
+        return {
+            "row_count": len(results),
+            "sample": results[:RESPONSE_SAMPLE_ROWS],
+            "totals": totals
+        }
+    
+    def _natural_response_request(self, user_query: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build chat completion arguments for natural response generation."""
         # Create prompt for natural response generation
         system_prompt = """Generate a natural, conversational response about financial data. 
         Be precise with numbers, use proper currency formatting ($X.XX), and provide helpful context."""
         
         user_prompt = f"""User asked: "{user_query}"
-        SQL query returned: {json.dumps(results, indent=2)}
+        SQL query returned (summary): {dumps_json_indented(self._summarize_results(results))}
         
         Generate a natural response with:
         1. Direct answer to the question
@@ -216,24 +461,87 @@ Generate the SQL query:"""
         - "Your top spending category was Restaurants with $X.XX."
         """
         
+        return {
+            "model": self.nl_model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": 0.3,
+            "max_tokens": 200
+        }
+    
+    def _precheck_response(self, sql_results: Dict[str, Any]) -> Optional[str]:
+        """Return a canned response for failed or empty results, else None."""
+        if not sql_results["success"]:
+            return f"I couldn't process your query due to an error: {sql_results.get('error', 'Unknown error')}"
+        
+        if not sql_results["results"]:
+            return "I couldn't find any transactions matching your criteria. You might want to try a different time period or category."
+        
+        return None
+    
+    def generate_natural_response(self, user_query: str, sql_results: Dict[str, Any]) -> str:
+        """Generate natural language response from SQL results."""
+        
+        if not self.client:
+            return self._fallback_response(sql_results)
+        
+        canned = self._precheck_response(sql_results)
+        if canned:
+            return canned
+        
         try:
             response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.3,
-                max_tokens=200
+                **self._natural_response_request(user_query, sql_results["results"])
             )
+            return response.choices[0].message.content.strip()
             
+        except Exception as e:
+            return self._fallback_response(sql_results)
+    
+    async def generate_natural_response_async(self, user_query: str, sql_results: Dict[str, Any]) -> str:
+        """Async version of generate_natural_response."""
+        
+        if not self.aclient:
+            return self._fallback_response(sql_results)
+        
+        canned = self._precheck_response(sql_results)
+        if canned:
+            return canned
+        
+        try:
+            response = await self.aclient.chat.completions.create(
+                **self._natural_response_request(user_query, sql_results["results"])
+            )
             return response.choices[0].message.content.strip()
             
         except Exception as e:
             return self._fallback_response(sql_results)
     
-    def _fallback_response(self, sql_results: Dict[str, Any]) -> str:
-        """Generate fallback response when LLM is not available."""
+    @staticmethod
+    def _is_amount(name: str, value: Any) -> bool:
+        """Whether a numeric result value is a money amount rather than a count."""
+        # Amounts are REAL in the schema, so integers are counts whatever their alias
+        if isinstance(value, int):
+            return False
+        name = name.lower()
+        return not ("count" in name or name.endswith("_id") or name.endswith("_used"))
+    
+    def _format_value(self, name: str, value: Any) -> str:
+        """Format a single result value, as currency when it is an amount."""
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return str(value)
+        if self._is_amount(name, value):
+            return f"${value:,.2f}"
+        return f"{value:,}"
+    
+    def _format_results(self, sql_results: Dict[str, Any]) -> Optional[str]:
+        """Deterministically format results based on their shape.
+        
+        Returns None for multi-row, multi-column results, which are left
+        to the LLM when it is available.
+        """
         if not sql_results["success"]:
             return f"Query failed: {sql_results.get('error', 'Unknown error')}"
         
@@ -241,41 +549,82 @@ Generate the SQL query:"""
         if not results:
             return "No results found for your query."
         
-        # Simple formatting based on result structure
-        if len(results) == 1 and len(results[0]) == 1:
+        shape = (len(results), len(results[0]))
+        
+        if shape == (1, 1):
             # Single value result
-            value = list(results[0].values())[0]
-            if isinstance(value, (int, float)) and value > 1:
-                return f"Result: ${value:.2f}"
-            else:
-                return f"Result: {value}"
-        else:
-            return f"Found {len(results)} results. Sample: {results[0]}"
-    
-    def process_query(self, user_query: str) -> QueryResult:
-        """Process a natural language query using LLM+SQL approach."""
+            name, value = next(iter(results[0].items()))
+            if value is None:
+                return "No results found for your query."
+            return f"Result: {self._format_value(name, value)}"
         
-        # Generate SQL from natural language
-        sql_gen_result = self.generate_sql(user_query)
+        if shape[0] == 1:
+            # Single row - spending total with transaction count, or a field list
+            row = results[0]
+            numeric = {k: v for k, v in row.items()
+                       if isinstance(v, (int, float)) and not isinstance(v, bool)}
+            count_key = next((k for k, v in numeric.items() if not self._is_amount(k, v)), None)
+            total_key = next((k for k, v in numeric.items() if self._is_amount(k, v)), None)
+            if None in row.values() and not any(numeric.values()):
+                # Aggregates over zero matching rows (SUM/AVG are NULL, COUNT is 0)
+                return "No results found for your query."
+            if len(row) == 2 and count_key and total_key and total_key.lower() in SPEND_TOTAL_COLUMNS:
+                return f"You spent ${row[total_key]:,.2f} across {row[count_key]:,} transactions."
+            return ", ".join(f"{k}: {self._format_value(k, v)}" for k, v in row.items())
         
-        if not sql_gen_result["success"]:
-            return QueryResult(
-                success=False,
-                query=user_query,
-                sql_generated=None,
-                sql_results={},
-                natural_response=f"Could not generate SQL: {sql_gen_result['error']}",
-                error=sql_gen_result["error"]
-            )
+        if shape[1] == 1:
+            # Single column - list the values in order (e.g. top-N)
+            name = next(iter(results[0]))
+            column = results.column(name) if isinstance(results, LazyRows) else (row[name] for row in results)
+            values = [self._format_value(name, value)
+                      for value in islice(column, RESPONSE_LIST_VALUES)]
+            remaining = len(results) - len(values)
+            more = f", and {remaining:,} more" if remaining > 0 else ""
+            return f"Found {len(results)} results: " + ", ".join(values) + more
         
-        sql_query = sql_gen_result["sql"]
+        return None
+    
+    def _fallback_response(self, sql_results: Dict[str, Any]) -> str:
+        """Generate fallback response when LLM is not available."""
+        formatted = self._format_results(sql_results)
+        if formatted is not None:
+            return formatted
         
-        # Execute SQL query
-        sql_results = self.sql_tool.execute_query(sql_query)
+        results = sql_results["results"]
+        return f"Found {len(results)} results. Sample: {results[0]}"
+    
+    def _fill_response_template(self, template: Optional[str], sql_results: Dict[str, Any]) -> Optional[str]:
+        """Fill the model's response template from a single-row result.
         
-        # Generate natural language response
-        natural_response = self.generate_natural_response(user_query, sql_results)
+        Returns None when the template can't be used, so the caller falls
+        back to a separate natural response call.
+        """
+        if not template or not sql_results["success"] or len(sql_results["results"]) != 1:
+            return None
         
+        try:
+            return template.format(**sql_results["results"][0])
+        except (KeyError, IndexError, ValueError, TypeError):
+            return None
+    
+    def _sql_failure(self, user_query: str, sql_gen_result: Dict[str, Any]) -> QueryResult:
+        """Build the QueryResult for a failed SQL generation."""
+        return QueryResult(
+            success=False,
+            query=user_query,
+            sql_generated=None,
+            sql_results={},
+            natural_response=f"Could not generate SQL: {sql_gen_result['error']}",
+            error=sql_gen_result["error"]
+        )
+    
+    def _execute_generated_sql(self, sql_query: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Execute generated SQL scoped to the current client's rows."""
+        return self.sql_tool.execute_query(sql_query, params or {}, client_id=self.current_client_id)
+    
+    def _build_result(self, user_query: str, sql_query: str, sql_results: Dict[str, Any],
+                      natural_response: str) -> QueryResult:
+        """Build the QueryResult for an executed query."""
         return QueryResult(
             success=sql_results["success"],
             query=user_query,
@@ -284,6 +633,135 @@ Generate the SQL query:"""
             natural_response=natural_response,
             error=sql_results.get("error") if not sql_results["success"] else None
         )
+    
+    def _cache_key(self, user_query: str) -> str:
+        """Cache key for the current client and a normalized query."""
+        normalized = " ".join(user_query.lower().split())
+        return hashlib.blake2b(f"{self.current_client_id}|{normalized}".encode(), digest_size=16).hexdigest()
+    
+    def _cache_get(self, key: str) -> Optional[QueryResult]:
+        """Return a cached result, marking it most recently used."""
+        result = self._response_cache.get(key)
+        if result is not None:
+            self._response_cache.move_to_end(key)
+        return result
+    
+    def _cache_put(self, key: str, result: QueryResult) -> None:
+        """Cache a successful result, evicting the least recently used."""
+        if not result.success:
+            return
+        self._response_cache[key] = result
+        self._response_cache.move_to_end(key)
+        if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
+    
+    def process_query(self, user_query: str) -> QueryResult:
+        """Process a natural language query using LLM+SQL approach."""
+        key = self._cache_key(user_query)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return replace(cached, query=user_query)
+        
+        result = self._process_query_uncached(user_query)
+        self._cache_put(key, result)
+        return result
+    
+    async def process_query_async(self, user_query: str) -> QueryResult:
+        """Async version of process_query, for running many queries concurrently."""
+        key = self._cache_key(user_query)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return replace(cached, query=user_query)
+        
+        result = await self._process_query_uncached_async(user_query)
+        self._cache_put(key, result)
+        return result
+    
+    def process_queries_batch(self, user_queries: List[str]) -> List[QueryResult]:
+        """Process several queries, generating SQL for all LLM-bound ones in one call."""
+        keys = [self._cache_key(q) for q in user_queries]
+        results: List[Optional[QueryResult]] = []
+        for key, user_query in zip(keys, user_queries):
+            cached = self._cache_get(key)
+            results.append(replace(cached, query=user_query) if cached is not None else None)
+        
+        pending = [i for i, result in enumerate(results) if result is None]
+        sql_gen_results = {i: self._try_template(user_queries[i]) for i in pending}
+        misses = [i for i in pending if sql_gen_results[i] is None]
+        if misses:
+            batch = self.generate_sqls_batch([user_queries[i] for i in misses])
+            sql_gen_results.update(zip(misses, batch))
+        
+        for i in pending:
+            results[i] = self._complete_query(user_queries[i], sql_gen_results[i])
+            self._cache_put(keys[i], results[i])
+        
+        return results
+    
+    def _process_query_uncached(self, user_query: str) -> QueryResult:
+        """Run the routing/LLM, SQL and response steps for a query."""
+        
+        # Common questions are answered from canonical SQL; otherwise ask the LLM
+        sql_gen_result = self._try_template(user_query) or self.generate_sql(user_query)
+        return self._complete_query(user_query, sql_gen_result)
+    
+    def _generation_failure(self, user_query: str, sql_gen_result: Dict[str, Any]) -> Optional[QueryResult]:
+        """Return the QueryResult for SQL that must not be executed, else None."""
+        if not sql_gen_result["success"]:
+            return self._sql_failure(user_query, sql_gen_result)
+        
+        return None
+    
+    def _local_response(self, sql_gen_result: Dict[str, Any], sql_results: Dict[str, Any]) -> Optional[str]:
+        """Build the response without an LLM call, or None if one is needed."""
+        # Single-row answers come straight from the template generated with the SQL,
+        # then deterministic formatting; only multi-row, multi-column results
+        # need a second LLM call
+        natural_response = self._fill_response_template(sql_gen_result.get("response_template"), sql_results)
+        if natural_response is None:
+            natural_response = self._format_results(sql_results)
+        return natural_response
+    
+    def _complete_query(self, user_query: str, sql_gen_result: Dict[str, Any]) -> QueryResult:
+        """Execute generated SQL and build the response for a query."""
+        failure = self._generation_failure(user_query, sql_gen_result)
+        if failure:
+            return failure
+        
+        sql_query = sql_gen_result["sql"]
+        sql_results = self._execute_generated_sql(sql_query, sql_gen_result.get("params"))
+        
+        natural_response = self._local_response(sql_gen_result, sql_results)
+        if natural_response is None:
+            natural_response = self.generate_natural_response(user_query, sql_results)
+        
+        return self._build_result(user_query, sql_query, sql_results, natural_response)
+    
+    async def _process_query_uncached_async(self, user_query: str) -> QueryResult:
+        """Async version of _process_query_uncached."""
+        
+        # Common questions are answered from canonical SQL; otherwise ask the LLM
+        sql_gen_result = self._try_template(user_query) or await self.generate_sql_async(user_query)
+        return await self._complete_query_async(user_query, sql_gen_result)
+    
+    async def _complete_query_async(self, user_query: str, sql_gen_result: Dict[str, Any]) -> QueryResult:
+        """Async version of _complete_query."""
+        failure = self._generation_failure(user_query, sql_gen_result)
+        if failure:
+            return failure
+        
+        sql_query = sql_gen_result["sql"]
+        # Execute SQL off the event loop so concurrent queries use the connection pool
+        loop = asyncio.get_running_loop()
+        sql_results = await loop.run_in_executor(
+            None, self._execute_generated_sql, sql_query, sql_gen_result.get("params")
+        )
+        
+        natural_response = self._local_response(sql_gen_result, sql_results)
+        if natural_response is None:
+            natural_response = await self.generate_natural_response_async(user_query, sql_results)
+        
+        return self._build_result(user_query, sql_query, sql_results, natural_response)
 
 def main():
     """Interactive command-line interface for the financial assistant."""
@@ -298,97 +776,100 @@ def main():
         print(f"❌ Error initializing assistant: {e}")
         return
     
-    # Show available clients
-    print("\n📋 Available clients:")
     try:
-        import sqlite3
-        # Auto-detect database path - try multiple locations
-        import os
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        db_paths = [
-            os.path.join(current_dir, "transactions.db"),  # Same directory
-            os.path.join(current_dir, "..", "data", "transactions.db"),  # Submission data folder  
-            os.path.join(current_dir, "..", "transactions.db"),  # Parent directory
-        ]
-        
-        db_path = None
-        for path in db_paths:
-            if os.path.exists(path):
-                db_path = path
-                break
-        
-        if db_path is None:
-            raise FileNotFoundError("Could not find transactions.db in expected locations")
-        
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT clnt_id, COUNT(*) as total_transactions, 
-                   ROUND(SUM(ABS(amt)), 2) as total_spending,
-                   MIN(txn_date) as start_date, MAX(txn_date) as end_date
-            FROM transactions 
-            GROUP BY clnt_id 
-            ORDER BY clnt_id 
-            LIMIT 5
-        """)
-        clients = cursor.fetchall()
-        for client in clients:
-            client_id, txns, spending, start, end = client
-            print(f"  Client {client_id}: {txns} transactions, ${spending} total ({start[:10]} to {end[:10]})")
-        conn.close()
-    except Exception as e:
-        print(f"❌ Error loading clients: {e}")
-        return
-    
-    # Select a client
-    current_client = None
-    while True:
+        # Show available clients
+        print("\n📋 Available clients:")
         try:
-            if current_client is None:
-                client_input = input(f"\n🎯 Enter client ID (1-875) or 'quit': ").strip()
-                if client_input.lower() == 'quit':
-                    break
-                
-                client_id = int(client_input)
-                if assistant.set_client(client_id):
-                    current_client = client_id
-                    print(f"✅ Switched to client {client_id}")
-                else:
-                    print(f"❌ Client {client_id} not found")
-                    continue
+            import sqlite3
+            # Auto-detect database path - try multiple locations
+            import os
+            current_dir = os.path.dirname(os.path.abspath(__file__))
             
-            # Get user query
-            print(f"\n💬 Ask about Client {current_client}'s finances (or 'switch', 'quit'):")
-            user_query = input("Query: ").strip()
+            db_paths = [
+                os.path.join(current_dir, "transactions.db"),  # Same directory
+                os.path.join(current_dir, "..", "data", "transactions.db"),  # Submission data folder  
+                os.path.join(current_dir, "..", "transactions.db"),  # Parent directory
+            ]
             
-            if user_query.lower() == 'quit':
-                break
-            elif user_query.lower() == 'switch':
-                current_client = None
-                continue
-            elif not user_query:
-                continue
+            db_path = None
+            for path in db_paths:
+                if os.path.exists(path):
+                    db_path = path
+                    break
             
-            # Process query
-            print("🔄 Processing...")
-            result = assistant.process_query(user_query)
+            if db_path is None:
+                raise FileNotFoundError("Could not find transactions.db in expected locations")
             
-            print(f"\n📊 SQL Generated: {result.sql_generated}")
-            if result.success:
-                print(f"💡 Response: {result.natural_response}")
-            else:
-                print(f"❌ Error: {result.error}")
-                
-        except ValueError:
-            print("❌ Please enter a valid client ID number")
-        except (KeyboardInterrupt, EOFError):
-            print("\n\n👋 Goodbye!")
-            break
+            conn = sqlite3.connect(db_path)
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT clnt_id, COUNT(*) as total_transactions, 
+                       ROUND(SUM(ABS(amt)), 2) as total_spending,
+                       MIN(txn_date) as start_date, MAX(txn_date) as end_date
+                FROM transactions 
+                GROUP BY clnt_id 
+                ORDER BY clnt_id 
+                LIMIT 5
+            """)
+            clients = cursor.fetchall()
+            for client in clients:
+                client_id, txns, spending, start, end = client
+                print(f"  Client {client_id}: {txns} transactions, ${spending} total ({start[:10]} to {end[:10]})")
+            conn.close()
         except Exception as e:
-            print(f"❌ Error: {e}")
-            # If we get repeated errors, break to avoid infinite loop
-            continue
+            print(f"❌ Error loading clients: {e}")
+            return
+        
+        # Select a client
+        current_client = None
+        while True:
+            try:
+                if current_client is None:
+                    client_input = input(f"\n🎯 Enter client ID (1-875) or 'quit': ").strip()
+                    if client_input.lower() == 'quit':
+                        break
+                    
+                    client_id = int(client_input)
+                    if assistant.set_client(client_id):
+                        current_client = client_id
+                        print(f"✅ Switched to client {client_id}")
+                    else:
+                        print(f"❌ Client {client_id} not found")
+                        continue
+                
+                # Get user query
+                print(f"\n💬 Ask about Client {current_client}'s finances (or 'switch', 'quit'):")
+                user_query = input("Query: ").strip()
+                
+                if user_query.lower() == 'quit':
+                    break
+                elif user_query.lower() == 'switch':
+                    current_client = None
+                    continue
+                elif not user_query:
+                    continue
+                
+                # Process query
+                print("🔄 Processing...")
+                result = assistant.process_query(user_query)
+                
+                print(f"\n📊 SQL Generated: {result.sql_generated}")
+                if result.success:
+                    print(f"💡 Response: {result.natural_response}")
+                else:
+                    print(f"❌ Error: {result.error}")
+                    
+            except ValueError:
+                print("❌ Please enter a valid client ID number")
+            except (KeyboardInterrupt, EOFError):
+                print("\n\n👋 Goodbye!")
+                break
+            except Exception as e:
+                print(f"❌ Error: {e}")
+                # If we get repeated errors, break to avoid infinite loop
+                continue
+    finally:
+        assistant.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,10 +6,59 @@ Safe, constrained SQL execution for financial data queries.
 
 import sqlite3
 import re
-from typing import Dict, List, Any, Optional, Tuple
+import os
+import sys
+import queue
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Tuple, Union
+from collections.abc import Sequence
 from pathlib import Path
 import json
 
+try:
+    import orjson  # Optional C-accelerated JSON; falls back to stdlib json
+except ImportError:
+    orjson = None
+
+def loads_json(text: str) -> Any:
+    """Parse JSON text (orjson when available). Raises json.JSONDecodeError."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+def dumps_json_indented(obj: Any) -> str:
+    """Serialize to 2-space indented JSON (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
+class LazyRows(Sequence):
+    """Query rows kept as tuples, materialized as dicts only when accessed."""
+    
+    def __init__(self, rows: List[tuple], column_names: List[str]):
+        self._rows = rows
+        self._column_names = column_names
+        self._dicts: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._rows)))]
+        row = self._dicts[index]
+        if row is None:
+            row = self._dicts[index] = dict(zip(self._column_names, self._rows[index]))
+        return row
+    
+    def column(self, name: str):
+        """Iterate one column's raw values without building row dicts."""
+        position = self._column_names.index(name)
+        return (row[position] for row in self._rows)
+    
+    def __repr__(self) -> str:
+        return f"LazyRows({len(self._rows)} rows, columns={self._column_names})"
+
 class SQLQueryTool:
     """Safe SQL query execution tool for LLM integration."""
     
@@ -17,7 +66,6 @@ class SQLQueryTool:
         """Initialize with database connection."""
         if db_path is None:
             # Auto-detect database path - try multiple locations for submission
-            import os
             current_dir = os.path.dirname(os.path.abspath(__file__))
             
             db_paths = [
@@ -38,6 +86,21 @@ class SQLQueryTool:
         if not Path(db_path).exists():
             raise FileNotFoundError(f"Database not found: {db_path}")
         
+        # Pool of read-only connections so concurrent queries run in parallel; the
+        # tool never writes to the database (see setup_database for the migration)
+        self.pool_size = os.cpu_count() or 4
+        self._pool: "queue.SimpleQueue[Optional[sqlite3.Connection]]" = queue.SimpleQueue()
+        self._closed = False
+        for _ in range(self.pool_size):
+            self._pool.put(self._open_reader())
+        
+        # Parameterized statements for hot client lookups (hit SQLite's statement cache)
+        self._count_stmt = "SELECT COUNT(*) FROM transactions WHERE clnt_id = ?"
+        self._summary_stmt = (
+            "SELECT transaction_count, total_spending, first_transaction, last_transaction "
+            "FROM client_summary WHERE clnt_id = ?"
+        )
+        
         # Define allowed SQL patterns for security
         self.allowed_patterns = [
             r'^SELECT\s+',
@@ -68,38 +131,91 @@ class SQLQueryTool:
             r'/\*',
             r'xp_',
             r'sp_',
+            r'\b(main|temp)\s*\.',  # Schema-qualified names bypass the client scope CTE
         ]
+        # Single compiled alternation - one scan per query instead of one per pattern
+        self._forbidden_re = re.compile("|".join(self.forbidden_patterns), re.IGNORECASE)
+        self._table_re = re.compile(r'\bFROM\s+(transactions|client_summary)\b', re.IGNORECASE)
+        self._limit_re = re.compile(r'\bLIMIT\b', re.IGNORECASE)
         
         self.max_results = 1000  # Limit result size
         
+        # Client-scoped queries see only the bound client's rows: these CTEs shadow
+        # both tables, so no WHERE clause in the query itself can widen the scope
+        self._client_scope_cte = (
+            "WITH transactions AS (SELECT * FROM main.transactions WHERE clnt_id = :CLIENT_ID), "
+            "client_summary AS (SELECT * FROM main.client_summary WHERE clnt_id = :CLIENT_ID) "
+        )
+        
+        # Schema is static - build it and its prompt serialization once
+        self._schema = self.get_schema_info()
+        self._schema_json = dumps_json_indented(self._schema)
+        # Compact one-line table/column list for LLM prompts
+        self._schema_compact = ", ".join(
+            f"{table}({','.join(info['columns'])})"
+            for table, info in self._schema["tables"].items()
+        )
+        
+    @staticmethod
+    def _tune_connection(conn: sqlite3.Connection) -> None:
+        """Apply read-performance PRAGMAs to a connection."""
+        conn.execute("PRAGMA cache_size=-65536")  # 64MB page cache
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")  # 256MB memory-mapped reads
+    
+    def _open_reader(self) -> sqlite3.Connection:
+        """Open a read-only pooled connection."""
+        uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row  # Enable column access by name
+        self._tune_connection(conn)
+        return conn
+    
+    @contextmanager
+    def _reader(self):
+        """Borrow a pooled read-only connection, blocking until one is free."""
+        conn = None if self._closed else self._pool.get()
+        if conn is None:
+            # Closed - pass the wake-up sentinel on to any other waiting borrower
+            self._pool.put(None)
+            raise sqlite3.ProgrammingError("Cannot operate on a closed SQLQueryTool.")
+        try:
+            yield conn
+        finally:
+            if self._closed:
+                conn.close()
+            else:
+                self._pool.put(conn)
+    
     def validate_sql(self, sql: str) -> Tuple[bool, str]:
         """Validate SQL query for security and constraints."""
-        sql_upper = sql.upper().strip()
-        
-        # Must start with SELECT
-        if not sql_upper.startswith('SELECT'):
+        # Must start with SELECT (only the prefix is case-folded, not the whole query)
+        if sql.lstrip()[:6].upper() != 'SELECT':
             return False, "Only SELECT queries are allowed"
         
         # Check forbidden patterns
-        for pattern in self.forbidden_patterns:
-            if re.search(pattern, sql_upper):
-                return False, f"Forbidden SQL pattern detected: {pattern}"
+        match = self._forbidden_re.search(sql)
+        if match:
+            return False, f"Forbidden SQL pattern detected: {match.group(0).strip()}"
         
         # Must query allowed tables only
-        allowed_tables = ['transactions', 'client_summary']
-        if not any(f'FROM {table}' in sql_upper for table in ['TRANSACTIONS', 'CLIENT_SUMMARY']):
+        if not self._table_re.search(sql):
             return False, "Query must use 'transactions' or 'client_summary' table"
         
         # Check for potential injection attempts
-        suspicious_chars = [';', '"', "'"]
-        quote_count = sql.count("'")
-        if quote_count % 2 != 0:  # Unmatched quotes
+        if sql.count("'") % 2 != 0:  # Unmatched quotes
             return False, "Unmatched quotes detected"
         
         return True, "Query validated successfully"
     
-    def execute_query(self, sql: str) -> Dict[str, Any]:
-        """Execute SQL query safely and return results."""
+    def execute_query(self, sql: str, params: Union[Tuple, Dict[str, Any]] = (),
+                      client_id: Optional[int] = None) -> Dict[str, Any]:
+        """Execute SQL query safely and return results.
+        
+        Optional params are bound to '?' (tuple) or ':name' (dict) placeholders.
+        With a client_id, the query only sees that client's rows and params must
+        be a dict; the id is bound as :CLIENT_ID.
+        """
         
         # Validate query
         is_valid, validation_msg = self.validate_sql(sql)
@@ -112,30 +228,27 @@ class SQLQueryTool:
             }
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row  # Enable column access by name
-            cursor = conn.cursor()
-            
             # Execute query with result limit if not already present
             sql_clean = sql.rstrip(';').strip()
-            if 'LIMIT' not in sql_clean.upper():
+            if not self._limit_re.search(sql_clean):
                 limited_sql = f"{sql_clean} LIMIT {self.max_results}"
             else:
                 limited_sql = sql_clean
-            cursor.execute(limited_sql)
-            
-            # Fetch results
-            rows = cursor.fetchall()
-            
-            # Convert to list of dictionaries
-            results = []
-            for row in rows:
-                results.append(dict(row))
+            if client_id is not None:
+                limited_sql = self._client_scope_cte + limited_sql
+                params = {**params, "CLIENT_ID": client_id}
+            with self._reader() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None  # Plain tuples; dicts are built lazily
+                cursor.execute(limited_sql, params)
+                
+                # Fetch results
+                rows = cursor.fetchall()
+                
+                # Get column names
+                column_names = [description[0] for description in cursor.description] if rows else []
             
-            # Get column names
-            column_names = [description[0] for description in cursor.description] if rows else []
-            
-            conn.close()
+            results = LazyRows(rows, column_names)
             
             return {
                 "success": True,
@@ -161,6 +274,44 @@ class SQLQueryTool:
                 "results": []
             }
     
+    def count_txns_for_client(self, client_id: int) -> int:
+        """Return the number of transactions for a client."""
+        with self._reader() as conn:
+            row = conn.execute(self._count_stmt, (client_id,)).fetchone()
+        return row[0] if row else 0
+    
+    def client_summary(self, client_id: int) -> Optional[Dict[str, Any]]:
+        """Return a client's transaction count, total spending and date range, or None if missing."""
+        with self._reader() as conn:
+            row = conn.execute(self._summary_stmt, (client_id,)).fetchone()
+        return dict(row) if row else None
+    
+    def close(self) -> None:
+        """Close all pooled connections; later queries fail instead of waiting."""
+        pool = getattr(self, "_pool", None)
+        if pool is None or self._closed:
+            return
+        self._closed = True
+        while True:
+            try:
+                conn = pool.get_nowait()
+            except queue.Empty:  # Another thread may take the last connection first
+                break
+            if conn is not None:
+                conn.close()
+        pool.put(None)  # Wakes borrowers still blocked in _reader
+    
+    def __del__(self):
+        self.close()
+    
+    def _index_names(self) -> List[str]:
+        """Names of the indexes actually present on the transactions table."""
+        with self._reader() as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'transactions' "
+                "AND name NOT LIKE 'sqlite_autoindex%' ORDER BY name"
+            )]
+    
     def get_schema_info(self) -> Dict[str, Any]:
         """Get database schema information for LLM context."""
         schema_info = {
@@ -179,7 +330,7 @@ class SQLQueryTool:
                         "merchant": "TEXT - Merchant name (Unknown if not available)"
                     },
                     "primary_key": "(clnt_id, txn_id)",
-                    "indexes": ["idx_client_date", "idx_client_cat", "idx_client_merchant", "idx_date"]
+                    "indexes": self._index_names()
                 },
                 "client_summary": {
                     "description": "Pre-computed client summary statistics",
@@ -233,17 +384,58 @@ class SQLQueryTool:
             else:
                 print(f"   ❌ Error: {result['error']}")
 
+COVERING_INDEXES = {
+    "idx_client_date_amt": "transactions(clnt_id, txn_date, amt)",
+    "idx_client_cat_amt": "transactions(clnt_id, cat, amt)",
+}
+
+def setup_database(db_path: str) -> List[str]:
+    """One-off migration: covering indexes for client aggregates.
+    
+    SUM(ABS(amt)) filtered by client and date or category can then be
+    answered from the index alone. ANALYZE runs only when an index is new.
+    Returns the names of the indexes created.
+    
+    An abs_amt generated column is deliberately not used: SQLite never
+    treats generated columns as covered by an index, so SUM(abs_amt)
+    falls back to table row lookups and is slower than ABS() over the
+    covering amt index.
+    
+    The rollback journal is kept (WAL set by an earlier setup is reverted):
+    the tool only reads, and read-only connections to a WAL database
+    leave -wal/-shm files behind that they cannot remove.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=DELETE")
+        existing = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        )}
+        missing = [name for name in COVERING_INDEXES if name not in existing]
+        for name in missing:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {COVERING_INDEXES[name]}")
+        if missing:
+            conn.execute("ANALYZE")
+        return missing
+    finally:
+        conn.close()
+
 def main():
-    """Test the SQL Query Tool."""
+    """Test the SQL Query Tool, or migrate the database with --setup."""
     tool = SQLQueryTool()
     
+    if "--setup" in sys.argv[1:]:
+        tool.close()
+        created = setup_database(tool.db_path)
+        print(f"✅ {tool.db_path}: indexes created: {', '.join(created) or 'none'}")
+        return
+    
     # Test basic functionality
     tool.test_queries()
     
     # Display schema info
     print(f"\n📋 Database Schema Information:")
-    schema = tool.get_schema_info()
-    print(json.dumps(schema, indent=2))
+    print(tool._schema_json)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
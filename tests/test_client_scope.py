@@ -0,0 +1,85 @@
+"""Tests that generated SQL only ever sees the current client's rows."""
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from llm_sql_assistant import LLMSQLAssistant
+
+DB_PATH = Path(__file__).resolve().parent.parent / "data" / "transactions.db"
+CLIENT_ID = 2
+OTHER_CLIENT_ID = 5
+
+
+@pytest.fixture(scope="module")
+def assistant():
+    assistant = LLMSQLAssistant(str(DB_PATH))
+    assert assistant.set_client(CLIENT_ID)
+    yield assistant
+    assistant.close()
+
+
+@pytest.fixture(scope="module")
+def client_total():
+    with closing(sqlite3.connect(f"{DB_PATH.as_uri()}?mode=ro", uri=True)) as conn:
+        return conn.execute(
+            "SELECT SUM(ABS(amt)), COUNT(*) FROM transactions WHERE clnt_id = ?", (CLIENT_ID,)
+        ).fetchone()
+
+
+def run_generated(assistant, monkeypatch, sql):
+    """Run SQL through process_query as if the LLM had generated it."""
+    monkeypatch.setattr(assistant, "generate_sql", lambda query: {
+        "success": True, "sql": sql, "params": {}, "explanation": "test"
+    })
+    assistant._response_cache.clear()
+    result = assistant.process_query("Which rows can I see?")
+    assert result.success, result.error
+    return result.sql_results["results"]
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT SUM(ABS(amt)) AS total, COUNT(*) AS count FROM transactions WHERE clnt_id = :CLIENT_ID",
+    "SELECT SUM(ABS(amt)) AS total, COUNT(*) AS count FROM transactions",
+    "SELECT SUM(ABS(amt)) AS total, COUNT(*) AS count FROM transactions WHERE clnt_id = :CLIENT_ID OR 1=1",
+    "SELECT SUM(ABS(amt)) AS total, COUNT(*) AS count FROM transactions "
+    f"WHERE clnt_id = :CLIENT_ID OR clnt_id = {OTHER_CLIENT_ID}",
+    "SELECT SUM(ABS(amt)) AS total, COUNT(*) AS count FROM transactions WHERE clnt_id != :CLIENT_ID OR 1=1",
+])
+def test_spending_is_scoped_to_client(assistant, monkeypatch, client_total, sql):
+    row = run_generated(assistant, monkeypatch, sql)[0]
+    assert (row["total"], row["count"]) == pytest.approx(client_total)
+
+
+def test_literal_other_client_id_sees_nothing(assistant, monkeypatch):
+    rows = run_generated(
+        assistant, monkeypatch,
+        f"SELECT COUNT(*) AS count FROM transactions WHERE clnt_id = {OTHER_CLIENT_ID}"
+    )
+    assert rows[0]["count"] == 0
+
+
+def test_subquery_filter_does_not_widen_outer_query(assistant, monkeypatch):
+    rows = run_generated(
+        assistant, monkeypatch,
+        "SELECT DISTINCT clnt_id FROM transactions "
+        "WHERE amt > (SELECT AVG(amt) FROM transactions WHERE clnt_id = :CLIENT_ID)"
+    )
+    assert [row["clnt_id"] for row in rows] == [CLIENT_ID]
+
+
+def test_client_summary_is_scoped(assistant, monkeypatch):
+    rows = run_generated(assistant, monkeypatch, "SELECT clnt_id FROM client_summary")
+    assert [row["clnt_id"] for row in rows] == [CLIENT_ID]
+
+
+def test_schema_qualified_table_is_rejected(assistant, monkeypatch):
+    monkeypatch.setattr(assistant, "generate_sql", lambda query: {
+        "success": True, "sql": "SELECT COUNT(*) FROM transactions, main.transactions", "params": {}
+    })
+    assistant._response_cache.clear()
+    result = assistant.process_query("Which rows can I see?")
+    assert not result.sql_results["success"]
+    assert "main." in result.sql_results["error"]
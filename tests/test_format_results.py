@@ -0,0 +1,82 @@
+"""Tests for deterministic result formatting (LLMSQLAssistant._format_results)."""
+
+from pathlib import Path
+
+import pytest
+
+from llm_sql_assistant import LLMSQLAssistant, RESPONSE_LIST_VALUES
+from sql_query_tool import LazyRows
+
+DB_PATH = Path(__file__).resolve().parent.parent / "data" / "transactions.db"
+
+
+@pytest.fixture(scope="module")
+def assistant():
+    assistant = LLMSQLAssistant(str(DB_PATH))
+    yield assistant
+    assistant.close()
+
+
+def results(column_names, *rows):
+    return {"success": True, "results": LazyRows(list(rows), column_names)}
+
+
+def test_failed_and_empty_results(assistant):
+    assert assistant._format_results({"success": False, "error": "boom"}) == "Query failed: boom"
+    assert assistant._format_results(results(["total"])) == "No results found for your query."
+
+
+def test_single_value(assistant):
+    assert assistant._format_results(results(["total"], (1234.5,))) == "Result: $1,234.50"
+    assert assistant._format_results(results(["total"], (None,))) == "No results found for your query."
+
+
+def test_integer_counts_are_not_currency(assistant):
+    text = assistant._format_results(results(["total_transactions"], (77,)))
+    assert text == "Result: 77"
+
+
+def test_spend_total_with_count(assistant):
+    text = assistant._format_results(results(["total", "count"], (13806.726, 77)))
+    assert text == "You spent $13,806.73 across 77 transactions."
+
+
+@pytest.mark.parametrize("column", ["avg_spend", "max_amt", "net"])
+def test_other_aggregates_use_field_list(assistant, column):
+    text = assistant._format_results(results([column, "count"], (179.31, 77)))
+    assert text == f"{column}: $179.31, count: 77"
+
+
+@pytest.mark.parametrize("row", [(None, 0), (None, None)])
+def test_aggregates_over_no_rows(assistant, row):
+    text = assistant._format_results(results(["total", "count"], row))
+    assert text == "No results found for your query."
+
+
+def test_aggregates_over_no_rows_from_database(assistant):
+    assert assistant.set_client(2)
+    sql_results = assistant._execute_generated_sql(
+        "SELECT SUM(ABS(amt)) AS total, COUNT(*) AS count FROM transactions "
+        "WHERE clnt_id = :CLIENT_ID AND cat = 'Shops'"
+    )
+    assert sql_results["results"][0] == {"total": None, "count": 0}
+    assert assistant._local_response(
+        {"response_template": "You spent ${total:,.2f} across {count} transactions."}, sql_results
+    ) == "No results found for your query."
+
+
+def test_single_column_is_capped(assistant):
+    rows = [(float(i),) for i in range(RESPONSE_LIST_VALUES + 5)]
+    text = assistant._format_results(results(["amt"], *rows))
+    assert text.startswith(f"Found {len(rows)} results: $0.00, $1.00")
+    assert text.endswith(", and 5 more")
+    assert text.count("$") == RESPONSE_LIST_VALUES
+
+
+def test_single_column_without_remainder(assistant):
+    text = assistant._format_results(results(["cat"], ("Payroll",), ("Loans",)))
+    assert text == "Found 2 results: Payroll, Loans"
+
+
+def test_multi_row_multi_column_is_left_to_llm(assistant):
+    assert assistant._format_results(results(["cat", "total"], ("Loans", 1.0), ("Payroll", 2.0))) is None
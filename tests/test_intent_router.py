@@ -0,0 +1,95 @@
+"""Tests for the deterministic intent router (LLMSQLAssistant._try_template)."""
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from llm_sql_assistant import LLMSQLAssistant
+
+DB_PATH = Path(__file__).resolve().parent.parent / "data" / "transactions.db"
+CLIENT_ID = 2
+
+
+@pytest.fixture(scope="module")
+def assistant():
+    assistant = LLMSQLAssistant(str(DB_PATH))
+    assert assistant.set_client(CLIENT_ID)
+    yield assistant
+    assistant.close()
+
+
+def run_template(assistant, query):
+    template = assistant._try_template(query)
+    assert template is not None, query
+    result = assistant._execute_generated_sql(template["sql"], template["params"])
+    assert result["success"], result
+    return template, result["results"][0]
+
+
+def direct_count(assistant, where="", params=()):
+    sql = f"SELECT COUNT(*) FROM transactions WHERE clnt_id = ? {where}"
+    with closing(sqlite3.connect(f"{DB_PATH.as_uri()}?mode=ro", uri=True)) as conn:
+        return conn.execute(sql, (CLIENT_ID, *params)).fetchone()[0]
+
+
+@pytest.mark.parametrize("query", [
+    "Did I spend more on restaurants than on shops?",
+    "Did I spend more in July than in August?",
+    "How much did I spend in July vs August?",
+    "How much did I spend in July and August?",
+    "What is my average spending on restaurants?",
+    "What was my avg spend in July?",
+    "What was my biggest spending day in July?",
+    "What was my largest transaction spent on shops?",
+    "Where did I spend the most in July?",
+    "What are my top spending categories?",
+    "How much did I spend per week in July?",
+    "How much did I spend each day on restaurants?",
+    "How many transactions per day did I make in July?",
+    "How much did I spend on streaming services?",
+    "How much did I spend on restaurants and shops?",
+    "May I know how much I spent on restaurants?",
+])
+def test_ambiguous_queries_go_to_llm(assistant, query):
+    assert assistant._try_template(query) is None
+
+
+def test_may_is_not_a_month(assistant):
+    template = assistant._try_template("How much did I spend on restaurants?")
+    assert "start" not in template["params"]
+    assert "may" not in assistant._month_re.pattern.split("|")
+
+
+def test_spend_by_month(assistant):
+    template, row = run_template(assistant, "How much did I spend in July?")
+    assert template["params"] == {"start": "2023-07-01", "end": "2023-08-01"}
+    assert row["count"] == direct_count(
+        assistant, "AND txn_date >= ? AND txn_date < ?", ("2023-07-01", "2023-08-01")
+    )
+
+
+def test_category_stem_matches_all_categories(assistant):
+    template, row = run_template(assistant, "How much did I spend on bank fees?")
+    assert sorted(template["params"].values()) == ["Bank Fee", "Bank Fees"]
+    assert "cat IN (" in template["sql"]
+    assert row["count"] == direct_count(assistant, "AND cat IN (?, ?)", ("Bank Fee", "Bank Fees"))
+
+
+def test_count_applies_category_and_month(assistant):
+    template, row = run_template(
+        assistant, "How many transactions did I make at restaurants in August?"
+    )
+    assert template["params"] == {"cat0": "Restaurants", "start": "2023-08-01", "end": "2023-09-01"}
+    assert row["count"] == direct_count(
+        assistant, "AND cat = ? AND txn_date >= ? AND txn_date < ?",
+        ("Restaurants", "2023-08-01", "2023-09-01")
+    )
+    assert template["response_template"].format(**row).endswith("on Restaurants in August.")
+
+
+def test_count_without_filters(assistant):
+    template, row = run_template(assistant, "How many transactions do I have?")
+    assert template["params"] == {}
+    assert row["count"] == direct_count(assistant)
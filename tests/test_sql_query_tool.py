@@ -0,0 +1,92 @@
+"""Tests for SQLQueryTool database access and the one-off setup migration."""
+
+import shutil
+import sqlite3
+import threading
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from sql_query_tool import COVERING_INDEXES, SQLQueryTool, setup_database
+
+DB_PATH = Path(__file__).resolve().parent.parent / "data" / "transactions.db"
+
+
+def index_names(db_path):
+    with closing(sqlite3.connect(f"{Path(db_path).as_uri()}?mode=ro", uri=True)) as conn:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def test_tool_does_not_modify_database():
+    before = (DB_PATH.stat().st_size, DB_PATH.stat().st_mtime_ns)
+    tool = SQLQueryTool(str(DB_PATH))
+    assert tool.client_summary(2)["transaction_count"] > 0
+    tool.close()
+    assert (DB_PATH.stat().st_size, DB_PATH.stat().st_mtime_ns) == before
+    assert not Path(f"{DB_PATH}-wal").exists()
+
+
+def test_schema_lists_only_existing_indexes():
+    tool = SQLQueryTool(str(DB_PATH))
+    tool.close()
+    indexes = tool._schema["tables"]["transactions"]["indexes"]
+    assert set(indexes) == {name for name in index_names(DB_PATH) if not name.startswith("sqlite_")}
+
+
+def test_setup_database_adds_covering_indexes(tmp_path):
+    db_copy = tmp_path / "transactions.db"
+    shutil.copyfile(DB_PATH, db_copy)
+    with closing(sqlite3.connect(db_copy)) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")  # As left by an earlier setup
+    missing = set(COVERING_INDEXES) - index_names(db_copy)
+    
+    assert set(setup_database(str(db_copy))) == missing
+    assert set(COVERING_INDEXES) <= index_names(db_copy)
+    assert setup_database(str(db_copy)) == []
+    with closing(sqlite3.connect(f"{db_copy.as_uri()}?mode=ro", uri=True)) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    
+    # Read-only pooled connections on the migrated database leave no journal files
+    tool = SQLQueryTool(str(db_copy))
+    assert set(COVERING_INDEXES) <= set(tool._schema["tables"]["transactions"]["indexes"])
+    assert tool.client_summary(2)["transaction_count"] > 0
+    tool.close()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["transactions.db"]
+
+
+def test_queries_fail_after_close():
+    tool = SQLQueryTool(str(DB_PATH))
+    tool.close()
+    
+    result = tool.execute_query("SELECT COUNT(*) FROM transactions WHERE clnt_id = 2")
+    assert not result["success"]
+    assert "closed" in result["error"]
+    with pytest.raises(sqlite3.ProgrammingError):
+        tool.client_summary(2)
+    with pytest.raises(sqlite3.ProgrammingError):
+        tool.count_txns_for_client(2)
+    tool.close()  # Idempotent
+
+
+def test_close_wakes_waiting_borrowers():
+    tool = SQLQueryTool(str(DB_PATH))
+    borrowed = [tool._pool.get() for _ in range(tool.pool_size)]  # Exhaust the pool
+    errors = []
+    
+    def borrow():
+        try:
+            tool.count_txns_for_client(2)
+        except sqlite3.ProgrammingError as e:
+            errors.append(e)
+    
+    waiters = [threading.Thread(target=borrow) for _ in range(2)]
+    for waiter in waiters:
+        waiter.start()
+    tool.close()
+    for waiter in waiters:
+        waiter.join(timeout=5)
+    assert not any(waiter.is_alive() for waiter in waiters)
+    assert len(errors) == 2
+    for conn in borrowed:
+        conn.close()